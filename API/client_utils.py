@@ -12,6 +12,11 @@ from config import LLM_MODEL_NAME, CHROMA_DB_PATH
 # Import tone system prompts
 from tone_system_prompts import get_tone_system_prompt
 
+# Seconds a healthy check_service_health result is reused for the same api_url
+HEALTH_CACHE_TTL = 30.0
+# api_url -> monotonic expiry of the last healthy result
+_health_cache = {}
+
 def convert_tone(text: str, tone: str = "child_friendly", model_url: str = "http://localhost:11435/api/chat", model_name: str = LLM_MODEL_NAME):
     """
     Convert the tone/style of a given text using a secondary agent (LLM rewriter).
@@ -196,16 +201,29 @@ def stream_rag_llm_query(api_url: str, text_user_msg: str, session_id: str):
             return accumulated_response
             
     except requests.exceptions.RequestException as e:
+        _forget_health(api_url)
         print(f"❌ Request error: {e}")
         return None
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
         return None
 
-def check_service_health(api_url: str):
-    """Check if the API service is healthy"""
+def _forget_health(api_url: str):
+    """Drop a cached healthy result, e.g. after any request to that service fails"""
+    _health_cache.pop(api_url, None)
+
+def check_service_health(api_url: str, session: requests.Session = None):
+    """Check if the API service is healthy (pass `session` to reuse a pooled keep-alive connection)
+
+    A healthy result is cached for HEALTH_CACHE_TTL seconds; unhealthy results are always re-checked.
+    """
+    if time.monotonic() < _health_cache.get(api_url, 0.0):
+        print("🔍 Service Health Check: healthy (cached)")
+        return True
+    
     try:
-        response = requests.get(f"{api_url}/health", timeout=5)
+        http = session or requests
+        response = http.get(f"{api_url}/health", timeout=5)
         response.raise_for_status()
         health_data = response.json()
         
@@ -214,9 +232,15 @@ def check_service_health(api_url: str):
         print(f"  RAG Initialized: {health_data.get('rag_initialized')}")
         print(f"  Timestamp: {health_data.get('timestamp')}")
         
-        return health_data.get('status') == 'healthy'
+        healthy = health_data.get('status') == 'healthy'
+        if healthy:
+            _health_cache[api_url] = time.monotonic() + HEALTH_CACHE_TTL
+        else:
+            _forget_health(api_url)
+        return healthy
         
     except Exception as e:
+        _forget_health(api_url)
         print(f"❌ Health check failed: {e}")
         return False
 
@@ -234,15 +258,17 @@ def initialize_rag_system(api_url: str):
         return result.get('success', False)
         
     except Exception as e:
+        _forget_health(api_url)
         print(f"❌ RAG initialization failed: {e}")
         return False
 
-def warmup_models(api_url: str):
+def warmup_models(api_url: str, session: requests.Session = None):
     """
     Warmup the embedding model and LLM to reduce first-request latency
     
     Args:
         api_url: Base URL of the API service (e.g., "http://localhost:5002")
+        session: Optional requests.Session to reuse its pooled connection
     
     Returns:
         dict: Warmup results with detailed timing information
@@ -251,17 +277,18 @@ def warmup_models(api_url: str):
         endpoint = f"{api_url}/api/rag-llm/warmup"
         
         print(f"🔥 Warming up models...")
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
-        response = requests.post(endpoint, timeout=None)  # Generous timeout for warmup
+        http = session or requests
+        response = http.post(endpoint, timeout=None)  # Generous timeout for warmup
         response.raise_for_status()
         result = response.json()
         
-        total_time = time.time() - start_time
+        total_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
         
         print(f"🔥 Model Warmup Results:")
         print(f"  Overall Success: {result.get('overall_success')}")
-        print(f"  Total Time: {total_time:.2f}s")
+        print(f"  Total Time: {total_ms}ms")
         
         # Embedding model results
         embedding_result = result.get('embedding_model', {})
@@ -284,9 +311,11 @@ def warmup_models(api_url: str):
         return result
         
     except requests.exceptions.Timeout:
+        _forget_health(api_url)
         print(f"❌ Model warmup timed out (60s)")
         return None
     except Exception as e:
+        _forget_health(api_url)
         print(f"❌ Model warmup failed: {e}")
         return None
 
@@ -326,5 +355,6 @@ def close_connection(api_url: str, session_id: str):
         return result.get('success', False)
         
     except Exception as e:
+        _forget_health(api_url)
         print(f"❌ Connection close failed: {e}")
         return False
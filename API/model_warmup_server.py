@@ -14,6 +14,8 @@ import signal
 import sys
 import threading
 import argparse
+import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from client_utils import warmup_models, check_service_health
 
@@ -32,6 +34,9 @@ class ModelWarmupServer:
         self.interval_seconds = interval_minutes * 60
         self.running = False
         self.warmup_thread = None
+        # Each cycle's health check and warmup go back-to-back to the same origin; keep that connection alive
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
         self.stats = {
             'total_warmups': 0,
             'successful_warmups': 0,
@@ -84,13 +89,13 @@ class ModelWarmupServer:
             print(f"{BLUE}🔥 [{now.strftime('%Y-%m-%d %H:%M:%S')}] Starting model warmup...{RESET}")
             
             # Check service health first
-            if not check_service_health(self.api_url):
+            if not check_service_health(self.api_url, session=self.session):
                 print(f"{RED}❌ Service health check failed - skipping warmup{RESET}")
                 self.stats['failed_warmups'] += 1
                 return False
             
             # Perform warmup
-            result = warmup_models(self.api_url)
+            result = warmup_models(self.api_url, session=self.session)
             
             if result and result.get('overall_success'):
                 print(f"{GREEN}✅ Model warmup completed successfully{RESET}")
@@ -145,7 +150,7 @@ class ModelWarmupServer:
         
         # Check initial service health
         print(f"{BLUE}🔍 Checking API service health...{RESET}")
-        if not check_service_health(self.api_url):
+        if not check_service_health(self.api_url, session=self.session):
             print(f"{RED}❌ API service is not healthy at {self.api_url}{RESET}")
             print(f"{YELLOW}⚠️ Make sure the RAG + LLM API service is running{RESET}")
             return False
@@ -183,6 +188,7 @@ class ModelWarmupServer:
         if self.warmup_thread and self.warmup_thread.is_alive():
             print(f"{BLUE}⏳ Waiting for warmup thread to finish...{RESET}")
             self.warmup_thread.join(timeout=5)
+        self.session.close()
         
         self._print_stats()
         print(f"{GREEN}👋 Warmup service stopped gracefully{RESET}")
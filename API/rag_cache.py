@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Response caching for the RAG + LLM API Service
+
+Museum kiosk traffic is dominated by the same handful of questions, so the QA
+answer for a first-turn question can be served from memory instead of running
+retrieval + LLM generation again.
+
+Two tiers:
+    1. Exact match   - blake2b hash of the normalized question (+ scope) -> response
+    2. Semantic match - cosine similarity of the retrieval query embedding against
+                        embeddings of previously answered questions (same scope only),
+                        stored as int8 with a per-vector scale (4x smaller than float32)
+"""
+
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and lowercase so trivially different inputs share a key"""
+    return _WS_RE.sub(" ", text or "").strip().lower()
+
+
+def quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Symmetric int8 quantization: returns (int8 codes, scale) with vector ~= codes * scale"""
+    peak = float(np.max(np.abs(vector)))
+    if peak == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8), 0.0
+    scale = peak / 127.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+class ResponseCache:
+    """Thread-safe two-tier (exact + semantic) LRU cache for QA responses (also used for RAG contexts)"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.RLock()
+        # key -> (created_at, response)
+        self._exact_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Semantic tier: preallocated (max_entries, D) int8 ring buffer of quantized unit vectors
+        # and their scales, allocated on first insert once D is known, plus parallel per-slot metadata
+        self._sem_mat: Optional[np.ndarray] = None
+        self._sem_scales = np.zeros(max_entries, dtype=np.float32)
+        self._sem_n = 0      # filled slots
+        self._sem_next = 0   # next slot to (over)write
+        self._sem_scopes: List[str] = [""] * max_entries
+        self._sem_vals: List[str] = [""] * max_entries
+        self._sem_created: List[float] = [0.0] * max_entries
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the normalized parts into a compact cache key"""
+        joined = "\x1f".join(normalize_text(part) for part in parts)
+        return hashlib.blake2b(joined.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get_exact(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on miss/expiry"""
+        with self._lock:
+            entry = self._exact_cache.get(key)
+            if entry is None:
+                return None
+            created_at, response = entry
+            if time.monotonic() - created_at > self.ttl_seconds:
+                del self._exact_cache[key]
+                return None
+            self._exact_cache.move_to_end(key)
+            return response
+
+    def get_semantic(self, embedding, scope: str = "") -> Optional[str]:
+        """Return the most similar cached response within `scope` if it clears the threshold"""
+        query = self._unit_vector(embedding)
+        if query is None:
+            return None
+
+        q_codes, q_scale = quantize(query)
+        q_codes = q_codes.astype(np.int32)
+
+        with self._lock:
+            n = self._sem_n
+            if n == 0 or self._sem_mat.shape[1] != query.shape[0]:
+                return None
+
+            # Integer dot products of the int8 codes against the quantized query, accumulated in int32
+            # (int8 sums would overflow), rescaled by both per-vector scales, give every cosine similarity
+            dots = self._sem_mat[:n].astype(np.int32, copy=False) @ q_codes
+            similarities = dots * (self._sem_scales[:n] * q_scale)
+            candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+            if candidates.size == 0:
+                return None
+
+            # Best match first; fall through when it belongs to another scope or has expired
+            now = time.monotonic()
+            for idx in candidates[np.argsort(similarities[candidates])[::-1]]:
+                if self._sem_scopes[idx] == scope and now - self._sem_created[idx] <= self.ttl_seconds:
+                    return self._sem_vals[idx]
+            return None
+
+    def put(self, key: str, response: str, embedding=None, scope: str = ""):
+        """Store a completed response in the exact tier and, if an embedding is given, the semantic tier"""
+        if not response:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._exact_cache[key] = (now, response)
+            self._exact_cache.move_to_end(key)
+            while len(self._exact_cache) > self.max_entries:
+                self._exact_cache.popitem(last=False)
+
+            vector = self._unit_vector(embedding)
+            if vector is None:
+                return
+            if self._sem_mat is None or self._sem_mat.shape[1] != vector.shape[0]:
+                # First insert, or the embedding model changed: start a fresh buffer
+                self._sem_mat = np.zeros((self.max_entries, vector.shape[0]), dtype=np.int8)
+                self._sem_n = self._sem_next = 0
+
+            slot = self._sem_next
+            self._sem_mat[slot], self._sem_scales[slot] = quantize(vector)
+            self._sem_scopes[slot] = scope
+            self._sem_vals[slot] = response
+            self._sem_created[slot] = now
+            self._sem_next = (slot + 1) % self.max_entries
+            self._sem_n = min(self._sem_n + 1, self.max_entries)
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._exact_cache.clear()
+            self._sem_mat = None
+            self._sem_scales.fill(0.0)
+            self._sem_n = self._sem_next = 0
+            self._sem_scopes = [""] * self.max_entries
+            self._sem_vals = [""] * self.max_entries
+            self._sem_created = [0.0] * self.max_entries
+
+    @staticmethod
+    def _unit_vector(embedding) -> Optional[np.ndarray]:
+        """L2-normalize an embedding so cosine similarity is a plain dot product"""
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if vector.ndim != 1 or norm == 0.0:
+            return None
+        return vector / norm
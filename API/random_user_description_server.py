@@ -12,7 +12,9 @@ Usage:
 
 import random
 import time
-from flask import Flask, jsonify
+from collections import OrderedDict
+import orjson
+from flask import Flask, Response
 from flask_cors import CORS
 
 # Colors for console output
@@ -63,6 +65,18 @@ USER_DESCRIPTION_POOL = [
     # "",  # Empty description for fallback testing
 ]
 
+# Pre-serialized response tails for each pool entry: (context, b'"visual_context":...,"available":...}')
+_POOL_JSON = [
+    (context, orjson.dumps({
+        "visual_context": context if context and context.strip() else None,
+        "available": bool(context and context.strip())
+    })[1:])
+    for context in USER_DESCRIPTION_POOL
+]
+
+# Sessions remembered for /sessions (oldest dropped first)
+MAX_TRACKED_SESSIONS = 1024
+
 class VisionContextAPISimulator:
     """Server that simulates the Vision Context API with random descriptions"""
     
@@ -71,7 +85,7 @@ class VisionContextAPISimulator:
         CORS(self.app)
         
         # Simulate active sessions (in production this would be managed by the vision system)
-        self.active_sessions = {}  # session_id -> {"vision_enabled": bool, "last_context": str, "timestamp": float}
+        self.active_sessions = OrderedDict()  # session_id -> {"vision_enabled": bool, "last_context": str, "timestamp": float}
         
         self._setup_routes()
         
@@ -101,10 +115,10 @@ class VisionContextAPISimulator:
                     "has_visual_context": bool(session_info["last_context"])
                 })
             
-            return jsonify({
+            return Response(orjson.dumps({
                 "active_sessions": sessions_data,
                 "total_sessions": len(sessions_data)
-            })
+            }), mimetype='application/json')
         
         @self.app.route('/visual-context/<sessionid>', methods=['GET'])
         def get_visual_context(sessionid):
@@ -121,40 +135,34 @@ class VisionContextAPISimulator:
             # time.sleep(0.1)
             
             # Always provide a fresh random description regardless of session state
-            context = random.choice(USER_DESCRIPTION_POOL)
-            vision_enabled = True
+            context, body_tail = random.choice(_POOL_JSON)
 
             self.active_sessions[sessionid] = {
-                "vision_enabled": vision_enabled,
+                "vision_enabled": True,
                 "last_context": context,
                 "timestamp": time.time()
             }
+            self.active_sessions.move_to_end(sessionid)
+            while len(self.active_sessions) > MAX_TRACKED_SESSIONS:
+                self.active_sessions.popitem(last=False)
             
-            session_info = self.active_sessions[sessionid]
-            context = session_info["last_context"]
-            
-            # Determine if visual context is available
-            available = session_info["vision_enabled"] and bool(context and context.strip())
-            
+            available = bool(context and context.strip())
             print(f"{BLUE}📸 Session {sessionid}: {'Available' if available else 'Not Available'} - '{context}'{RESET}")
             
-            # Return Vision API compatible response
-            return jsonify({
-                "sessionid": sessionid,
-                "visual_context": context if available else None,
-                "available": available
-            })
+            # Return Vision API compatible response (only the session id is serialized per request)
+            body = b'{"sessionid":' + orjson.dumps(sessionid) + b',' + body_tail
+            return Response(body, mimetype='application/json')
         
         @self.app.route('/api/simulator/pool', methods=['GET'])
         def get_pool_info():
             """Get information about the description pool (simulator-specific endpoint)"""
-            return jsonify({
+            return Response(orjson.dumps({
                 'success': True,
                 'pool_size': len(USER_DESCRIPTION_POOL),
                 'pool': USER_DESCRIPTION_POOL,
                 'active_sessions': len(self.active_sessions),
                 'timestamp': time.time()
-            })
+            }), mimetype='application/json')
     
     def run(self, host: str = '0.0.0.0', port: int = 5003, debug: bool = False):
         """Run the server"""
@@ -15,12 +15,123 @@ Usage:
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import re
 import time
+from functools import lru_cache
+from typing import NamedTuple, Tuple
 
 # API Configuration
 API_BASE_URL = "http://localhost:5002"
 API_ENDPOINT = "/api/rag-llm/query"
+API_BATCH_ENDPOINT = "/api/rag-llm/query_batch"
+API_TONE_ENDPOINT = "/api/rag-llm/tone"
+# Tone-specific expressions looked for in converted responses (one pass over the text)
+TONE_MARKERS = re.compile(r"\(\)|呢|啊")
+# Tone the server falls back to for empty / unclear descriptions
+DEFAULT_TONE = "casual_friendly"
+# Latin-script descriptions with at most this many words are too vague to classify ("a person standing")
+VAGUE_DESCRIPTION_MAX_WORDS = 3
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+# Socket read size for streamed responses (fewer, larger reads than the 512-byte default)
+STREAM_CHUNK_SIZE = 65536
+
+# Batch item skeleton: only the per-case strings are encoded, the constant flags are baked in
+ITEM_TEMPLATE = (b'{"text_user_msg":%s,"session_id":%s,"user_description":%s,"selected_tone":%s,'
+                 b'"convert_tone":true,"include_history":false}')
+
+# Shared keep-alive session: health check and test requests reuse its pooled connections
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                     max_retries=Retry(total=2, backoff_factor=0.1)))
+SESSION.headers["Content-Type"] = "application/json"  # bodies are pre-serialized with orjson
+SESSION.headers["Accept-Encoding"] = "identity"  # small NDJSON events: no per-chunk decompression
+
+class Case(NamedTuple):
+    """One dynamic tone test case"""
+    name: str
+    user_description: str
+    text_user_msg: str
+    expected_tone: str
+
+# Test cases with VLM visual descriptions for all 4 tones
+TEST_CASES: Tuple[Case, ...] = (
+    Case("Young Boy Test", "a young boy wearing glasses, and is smiling", "What is ITRI?", "child_friendly"),
+    Case("Young Boy Test", "a young boy wearing glasses, and is smiling", "哇！這裡看起來好酷喔！", "child_friendly"),
+    Case("Little Girl Test", "a little girl with pigtails holding a backpack", "工研院是什麼？", "child_friendly"),
+    Case("Teenager Test", "a teenager in school uniform looking curious", "What kind of research does ITRI do?", "child_friendly"),
+    Case("Elderly Man Test", "an elderly man with gray hair and wrinkles, wearing a cardigan", "工研院做什麼研究？", "elder_friendly"),
+    Case("Senior Woman Test", "an old woman with white hair using a walking stick", "Tell me about ITRI's history", "elder_friendly"),
+    Case("Chinese Elder Test", "一位白髮蒼蒼坐在輪椅上的老奶奶", "工研院的歷史如何？", "elder_friendly"),
+    Case("Business Professional Test", "a middle-aged person in business suit standing confidently in an office", "What are ITRI's main achievements?", "professional_friendly"),
+    Case("Formal Executive Test", "a man in formal attire holding documents in a conference room", "Tell me about ITRI's research capabilities", "professional_friendly"),
+    Case("Chinese Business Person Test", "穿西裝的商務人士站在辦公室裡", "工研院的技術發展如何？", "professional_friendly"),
+    Case("Casual Adult Test", "a person wearing jeans and t-shirt sitting relaxed", "Tell me about ITRI's technology", "casual_friendly"),
+    Case("Home Setting Test", "a woman wearing casual clothes at home on a couch", "What does ITRI do?", "casual_friendly"),
+    Case("Chinese Casual Test", "穿便服的中年人在家裡", "工研院有什麼特色？", "casual_friendly"),
+    Case("Unclear Description Test", "a person standing", "Tell me about ITRI's innovations", "casual_friendly"),  # Default when unclear
+    Case("Empty Description Test", "", "Tell me about ITRI's achievements", "casual_friendly"),  # Empty VLM description
+)
+
+@lru_cache(maxsize=256)
+def _get_tone(normalized_description: str) -> str:
+    """Resolve a (normalized) description's tone once; repeated descriptions skip the round trip"""
+    response = SESSION.post(
+        f"{API_BASE_URL}{API_TONE_ENDPOINT}",
+        data=orjson.dumps({"user_description": normalized_description}),
+        timeout=40
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content).get("tone")
+
+def _selected_tone(user_description: str):
+    """Client-side tone for a description (None when the lookup fails)"""
+    normalized = " ".join(user_description.split()).lower()
+    # Empty or vague (a few Latin-script words) descriptions always get the default tone: no lookup needed
+    if not normalized or (len(normalized.split()) <= VAGUE_DESCRIPTION_MAX_WORDS and not _CJK_RE.search(normalized)):
+        return DEFAULT_TONE
+    try:
+        return _get_tone(normalized)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Tone lookup failed, letting the server decide: {e}")
+        return None
+
+def _query_batch(items):
+    """POST pre-encoded items (bytes) to the batch endpoint and yield (idx, event) for each NDJSON line"""
+    with SESSION.post(
+        f"{API_BASE_URL}{API_BATCH_ENDPOINT}",
+        data=b'{"items":[' + b",".join(items) + b"]}",
+        stream=True,
+        timeout=300
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+            if line:
+                event = orjson.loads(line)
+                yield event["idx"], event
+
+def _report_case(i: int, test_case: Case, full_response: str, chunk_count: int, error: str = None) -> str:
+    """Format one finished test case (printed whole so interleaved streams don't mix)"""
+    report = [
+        f"\n🧪 Test {i}: {test_case.name}",
+        f"👁️ VLM Description: '{test_case.user_description}'",
+        f"❓ Question: '{test_case.text_user_msg}'",
+        f"🎯 Expected Tone: {test_case.expected_tone}",
+    ]
+    if error:
+        report.append(f"❌ Error in response: {error}")
+    else:
+        report.append("🏁 Stream completed")
+    report.append(f"📊 Response collected: {len(full_response)} chars in {chunk_count} chunks")
+    report.append(f"💬 Response preview: {full_response[:200]}...")
+    
+    # Check if response contains tone-specific expressions
+    has_tone_markers = TONE_MARKERS.search(full_response) is not None
+    report.append(f"🎨 Tone markers detected: {'✅' if has_tone_markers else '❌'}")
+    report.append("-" * 30)
+    return "\n".join(report)
 
 def test_dynamic_tone_selection():
     """Test the dynamic tone selection functionality"""
@@ -28,166 +139,34 @@ def test_dynamic_tone_selection():
     print("🧪 Testing Dynamic Tone Selection API")
     print("=" * 50)
     
-    # Test cases with VLM visual descriptions for all 4 tones
-    test_cases = [
-        {
-            "name": "Young Boy Test",
-            "user_description": "a young boy wearing glasses, and is smiling",
-            "text_user_msg": "What is ITRI?",
-            "expected_tone": "child_friendly"
-        },
-        {
-            "name": "Young Boy Test",
-            "user_description": "a young boy wearing glasses, and is smiling",
-            "text_user_msg": "哇！這裡看起來好酷喔！",
-            "expected_tone": "child_friendly"
-        },
-        {
-            "name": "Little Girl Test", 
-            "user_description": "a little girl with pigtails holding a backpack",
-            "text_user_msg": "工研院是什麼？",
-            "expected_tone": "child_friendly"
-        },
-        {
-            "name": "Teenager Test",
-            "user_description": "a teenager in school uniform looking curious",
-            "text_user_msg": "What kind of research does ITRI do?",
-            "expected_tone": "child_friendly"
-        },
-        {
-            "name": "Elderly Man Test",
-            "user_description": "an elderly man with gray hair and wrinkles, wearing a cardigan",
-            "text_user_msg": "工研院做什麼研究？",
-            "expected_tone": "elder_friendly"
-        },
-        {
-            "name": "Senior Woman Test",
-            "user_description": "an old woman with white hair using a walking stick",
-            "text_user_msg": "Tell me about ITRI's history",
-            "expected_tone": "elder_friendly"
-        },
-        {
-            "name": "Chinese Elder Test",
-            "user_description": "一位白髮蒼蒼坐在輪椅上的老奶奶",
-            "text_user_msg": "工研院的歷史如何？",
-            "expected_tone": "elder_friendly"
-        },
-        {
-            "name": "Business Professional Test",
-            "user_description": "a middle-aged person in business suit standing confidently in an office",
-            "text_user_msg": "What are ITRI's main achievements?",
-            "expected_tone": "professional_friendly"
-        },
-        {
-            "name": "Formal Executive Test",
-            "user_description": "a man in formal attire holding documents in a conference room",
-            "text_user_msg": "Tell me about ITRI's research capabilities",
-            "expected_tone": "professional_friendly"
-        },
-        {
-            "name": "Chinese Business Person Test",
-            "user_description": "穿西裝的商務人士站在辦公室裡",
-            "text_user_msg": "工研院的技術發展如何？",
-            "expected_tone": "professional_friendly"
-        },
-        {
-            "name": "Casual Adult Test",
-            "user_description": "a person wearing jeans and t-shirt sitting relaxed",
-            "text_user_msg": "Tell me about ITRI's technology",
-            "expected_tone": "casual_friendly"
-        },
-        {
-            "name": "Home Setting Test",
-            "user_description": "a woman wearing casual clothes at home on a couch",
-            "text_user_msg": "What does ITRI do?",
-            "expected_tone": "casual_friendly"
-        },
-        {
-            "name": "Chinese Casual Test",
-            "user_description": "穿便服的中年人在家裡",
-            "text_user_msg": "工研院有什麼特色？",
-            "expected_tone": "casual_friendly"
-        },
-        {
-            "name": "Unclear Description Test",
-            "user_description": "a person standing",
-            "text_user_msg": "Tell me about ITRI's innovations",
-            "expected_tone": "casual_friendly"  # Default when unclear
-        },
-        {
-            "name": "Empty Description Test",
-            "user_description": "",  # Empty VLM description
-            "text_user_msg": "Tell me about ITRI's achievements",
-            "expected_tone": "casual_friendly"  # Default fallback
-        }
-    ]
-    
     session_id = f"test_session_{int(time.time())}"
     
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\n🧪 Test {i}: {test_case['name']}")
-        print(f"👁️ VLM Description: '{test_case['user_description']}'")
-        print(f"❓ Question: '{test_case['text_user_msg']}'")
-        print(f"🎯 Expected Tone: {test_case['expected_tone']}")
-        
-        # Prepare request payload
-        payload = {
-            "text_user_msg": test_case["text_user_msg"],
-            "session_id": f"{session_id}_{i}",
-            "user_description": test_case["user_description"],
-            "convert_tone": True,
-            "include_history": False
-        }
-        
-        try:
-            # Make API request
-            print("🔄 Sending request...")
-            response = requests.post(
-                f"{API_BASE_URL}{API_ENDPOINT}", 
-                json=payload, 
-                stream=True,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                print("✅ Request successful, collecting streaming response...")
-                
-                # Collect streaming response
-                full_response = ""
-                chunk_count = 0
-                for line in response.iter_lines(decode_unicode=True):
-                    if line:
-                        if line == "END_FLAG":
-                            print("🏁 Stream completed")
-                            break
-                        elif line.startswith("ERROR:"):
-                            print(f"❌ Error in response: {line}")
-                            break
-                        else:
-                            full_response += line
-                            chunk_count += 1
-                
-                print(f"📊 Response collected: {len(full_response)} chars in {chunk_count} chunks")
-                print(f"💬 Response preview: {full_response[:200]}...")
-                
-                # Check if response contains tone-specific expressions
-                has_tone_markers = "()" in full_response or "呢" in full_response or "啊" in full_response
-                print(f"🎨 Tone markers detected: {'✅' if has_tone_markers else '❌'}")
-                
-            else:
-                print(f"❌ Request failed: {response.status_code}")
-                print(f"Error: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Network error: {e}")
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-        
-        print("-" * 30)
-        
-        # Wait between tests to avoid overwhelming the API
-        if i < len(test_cases):
-            time.sleep(2)
+    # All cases go out in one batch request; each item has its own session_id and streams back tagged by index
+    items = [
+        ITEM_TEMPLATE % (
+            orjson.dumps(test_case.text_user_msg),
+            orjson.dumps(f"{session_id}_{i}"),
+            orjson.dumps(test_case.user_description),
+            orjson.dumps(_selected_tone(test_case.user_description)),
+        )
+        for i, test_case in enumerate(TEST_CASES, 1)
+    ]
+    parts = [[] for _ in TEST_CASES]
+    errors = [None] * len(TEST_CASES)
+    
+    print(f"🔄 Sending {len(items)} test cases in one batch request...")
+    try:
+        for idx, event in _query_batch(items):
+            if "chunk" in event:
+                parts[idx].append(event["chunk"])
+            elif "error" in event:
+                errors[idx] = event["error"]
+            elif event.get("end"):
+                print(_report_case(idx + 1, TEST_CASES[idx], "".join(parts[idx]), len(parts[idx]), errors[idx]))
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Network error: {e}")
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
     
     print(f"\n🎉 VLM-based Dynamic Tone Selection Testing Complete!")
     print("Check the console output from the API service to see tone selection logs.")
@@ -203,9 +182,9 @@ def test_dynamic_tone_selection():
 def test_health_check():
     """Test if the API service is running"""
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        response = SESSION.get(f"{API_BASE_URL}/health", timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print(f"✅ API Health Check: {data['status']}")
             print(f"🤖 RAG Initialized: {data['rag_initialized']}")
             return True
@@ -227,10 +206,6 @@ def main():
     if not test_health_check():
         return 1
     
-    # Wait a moment
-    print("\n⏳ Starting tests in 3 seconds...")
-    time.sleep(3)
-    
     # Run the tests
     test_dynamic_tone_selection()
     
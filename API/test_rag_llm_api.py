@@ -7,23 +7,95 @@ RAG LLM API 測試腳本
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
 import sys
-import argparse
-from typing import Optional, Dict, Any
+import time
+import threading
+from contextlib import closing
+from typing import Optional, Dict, Any, Iterator, List, NamedTuple, Tuple, Union
+
+# 串流回應的 socket 讀取大小（比預設 512 bytes 更少、更大的讀取）
+STREAM_CHUNK_SIZE = 65536
+# 串流輸出至終端機的最短 flush 間隔（秒）；50ms 內的更新肉眼無法分辨
+STDOUT_FLUSH_INTERVAL = 0.05
+# run_test_case 接收緩衝區的初始大小（bytes），不足時自動擴充
+RECV_BUFFER_SIZE = 1 << 16
+
+
+class StreamResult(NamedTuple):
+    """一次串流查詢的量測結果（供測試腳本共用）"""
+    status_code: int
+    ttfb_ms: Optional[float]
+    total_ms: float
+    body: bytes              # 回應原始內容（UTF-8，不含 END_FLAG / ERROR 行）
+    chunk_count: int
+    error: Optional[str]
+    
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
 
 
 class RAGLLMAPIClient:
     """RAG LLM API 客戶端"""
     
-    def __init__(self, base_url: str = "http://localhost:5002"):
+    def __init__(self, base_url: str = "http://localhost:5002", max_connections: int = 20, max_retries=0):
         """
         初始化 API 客戶端
         
         Args:
             base_url: API 伺服器基礎 URL，預設為 http://localhost:5002
+            max_connections: 每個主機的 keep-alive 連線上限（多執行緒共用此客戶端時的最大並行請求數）
+            max_retries: 傳給 HTTPAdapter 的重試設定（次數或 urllib3 Retry），預設不重試
         """
         self.base_url = base_url.rstrip('/')
+        
+        # 共用連線池：所有請求重複使用 keep-alive 連線，避免每次重新建立 TCP 連線
+        self.session = requests.Session()
+        # pool_block：並行請求超過上限時等待空閒連線，而非另開用完即丟的連線
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max_connections, pool_block=True,
+                              max_retries=max_retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # 串流回應本身很小，不需壓縮：identity 省去每個區塊的解壓縮
+        self.session.headers.update({"Content-Type": "application/json", "Accept-Encoding": "identity"})
+        
+        # 正規化後的使用者描述 -> 語調，重複的描述不再請伺服器判斷
+        self._tone_cache: Dict[str, str] = {}
+        
+        # 每個執行緒一個可重複使用的接收緩衝區（run_test_case 連續呼叫時不再重新配置記憶體）
+        self._local = threading.local()
+    
+    def close(self):
+        """關閉連線池"""
+        self.session.close()
+    
+    @staticmethod
+    def _iter_line_batches(response):
+        """
+        依讀取批次產生串流回應中的完整行
+        
+        每次 socket 讀取（最多 STREAM_CHUNK_SIZE）會取得伺服器目前已送出的所有資料，
+        切成完整行後整批回傳；不完整的尾端保留到下一次讀取。
+        以 bytes 處理（UTF-8 多位元組字元不會被換行切開），由呼叫端每批解碼一次。
+        伺服器使用 chunked 傳輸時直接讀取 urllib3 的 chunk 內容，略過 requests 的串流包裝層。
+        
+        Yields:
+            該次讀取中的完整行列表（bytes）
+        """
+        if response.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            reads = response.raw.read_chunked(STREAM_CHUNK_SIZE, decode_content=True)
+        else:
+            reads = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        pending = b""
+        for data in reads:
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            if lines:
+                yield lines
+        if pending:
+            yield [pending]
     
     def health_check(self) -> Dict[str, Any]:
         """
@@ -33,13 +105,41 @@ class RAGLLMAPIClient:
             健康狀態資訊字典
         """
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
+            response = self.session.get(f"{self.base_url}/health", timeout=5)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"❌ 健康檢查失敗: {e}")
             return {}
     
+    def get_tone(self, user_description: str) -> Optional[str]:
+        """
+        取得使用者描述對應的語調（/api/rag-llm/tone），結果依正規化描述快取
+        
+        Args:
+            user_description: 使用者視覺描述
+        
+        Returns:
+            語調名稱（例如 "child_friendly"），失敗時回傳 None
+        """
+        key = " ".join(user_description.split()).lower()
+        if key in self._tone_cache:
+            return self._tone_cache[key]
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/rag-llm/tone",
+                data=orjson.dumps({"user_description": user_description}),
+                timeout=40
+            )
+            response.raise_for_status()
+            tone = orjson.loads(response.content).get("tone")
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 語調判斷失敗: {e}")
+            return None
+        if tone:
+            self._tone_cache[key] = tone
+        return tone
+    
     def query(
         self,
         text_user_msg: str,
@@ -75,6 +175,11 @@ class RAGLLMAPIClient:
         # 只有在提供 user_description 時才加入
         if user_description:
             payload["user_description"] = user_description
+            # 語調在客戶端解析並快取，伺服器可跳過語調判斷
+            if convert_tone:
+                selected_tone = self.get_tone(user_description)
+                if selected_tone:
+                    payload["selected_tone"] = selected_tone
         
         try:
             if stream:
@@ -89,48 +194,65 @@ class RAGLLMAPIClient:
                 print("📥 回應內容:")
                 print("="*70 + "\n")
                 
-                response = requests.post(
+                with self.session.post(
                     url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
+                    data=orjson.dumps(payload),
                     stream=True,
                     timeout=None  # 串流請求可能需要較長時間
-                )
-                response.raise_for_status()
+                ) as response:
+                    response.raise_for_status()
                 
-                # 處理串流回應
-                full_response = ""
-                chunk_count = 0
+                    # 處理串流回應
+                    response_parts = []  # joined once at the end (no quadratic +=)
+                    chunk_count = 0
+                    last_flush = time.monotonic()
                 
-                for line in response.iter_lines(decode_unicode=True):
-                    if not line:
-                        continue
-                    
-                    chunk_count += 1
-                    
-                    # 檢查是否為結束標記
-                    if line == "END_FLAG":
-                        print("\n" + "="*70)
-                        print(f"✅ 回應完成（共接收 {chunk_count} 個區塊）")
-                        print("="*70)
-                        break
-                    
-                    # 檢查錯誤訊息
-                    if line.startswith("ERROR:"):
-                        print(f"\n❌ 錯誤: {line}")
-                        return None
-                    
-                    # 顯示並累積回應內容
-                    print(line, end='', flush=True)
-                    full_response += line
+                    # 每次讀取時，伺服器一起送出的所有行合併處理：一次寫出、一次累積
+                    for lines in self._iter_line_batches(response):
+                        batch = []
+                        finished = False
+                        for line in lines:
+                            if not line:
+                                continue
+                            
+                            chunk_count += 1
+                            
+                            # 檢查是否為結束標記
+                            if line == b"END_FLAG":
+                                finished = True
+                                break
+                            
+                            # 檢查錯誤訊息
+                            if line.startswith(b"ERROR:"):
+                                sys.stdout.write(b"".join(batch).decode("utf-8", errors="replace"))
+                                print(f"\n❌ 錯誤: {line.decode('utf-8', errors='replace')}")
+                                return None
+                            
+                            batch.append(line)
+                        
+                        # 顯示並累積回應內容（每批只解碼一次，同一份字串用於輸出與累積）
+                        if batch:
+                            text = b"".join(batch).decode("utf-8", errors="replace")
+                            sys.stdout.write(text)
+                            response_parts.append(text)
+                            now = time.monotonic()
+                            if now - last_flush >= STDOUT_FLUSH_INTERVAL:
+                                sys.stdout.flush()
+                                last_flush = now
+                        
+                        if finished:
+                            sys.stdout.flush()
+                            print("\n" + "="*70)
+                            print(f"✅ 回應完成（共接收 {chunk_count} 個區塊）")
+                            print("="*70)
+                            break
                 
-                return full_response
+                return "".join(response_parts)
             else:
                 # 非串流模式（如果 API 支援）
-                response = requests.post(
+                response = self.session.post(
                     url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
+                    data=orjson.dumps(payload),
                     timeout=120
                 )
                 response.raise_for_status()
@@ -149,6 +271,83 @@ class RAGLLMAPIClient:
                 print(f"   錯誤詳情: {e.response.text}")
             return None
     
+    def query_batch(self, cases: List[Dict[str, Any]]) -> Iterator[Tuple[int, Optional[str]]]:
+        """
+        以單一請求送出多個獨立查詢（/api/rag-llm/query_batch）
+        
+        Args:
+            cases: 查詢列表，每項欄位與 query() 相同（text_user_msg、session_id、user_description、convert_tone...）
+        
+        Yields:
+            (idx, chunk)：idx 為 cases 中的索引；chunk 為回應片段、"ERROR: ..." 錯誤訊息，
+            或 None 表示該項查詢已結束
+        """
+        url = f"{self.base_url}/api/rag-llm/query_batch"
+        with self.session.post(url, data=orjson.dumps({"items": cases}), stream=True, timeout=None) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+                if not line:
+                    continue
+                event = orjson.loads(line)
+                idx = event["idx"]
+                if event.get("end"):
+                    yield idx, None
+                elif "error" in event:
+                    yield idx, f"ERROR: {event['error']}"
+                else:
+                    yield idx, event.get("chunk", "")
+    
+    def run_test_case(self, payload: Union[Dict[str, Any], bytes], endpoint: str = "/api/rag-llm/query",
+                      timeout: Optional[float] = None) -> StreamResult:
+        """
+        送出一個串流查詢並量測結果（不輸出內容），供各測試腳本共用
+        
+        Args:
+            payload: 請求內容（dict，或已用 orjson 編碼的 bytes）
+            endpoint: 串流查詢端點
+            timeout: 請求逾時秒數（None 表示不限）
+        
+        Returns:
+            StreamResult：狀態碼、首個位元組時間、總時間、回應內容、區塊數與錯誤訊息
+        """
+        data = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+        start = time.perf_counter()
+        with self.session.post(f"{self.base_url}{endpoint}", data=data, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                return StreamResult(response.status_code, None, (time.perf_counter() - start) * 1000,
+                                    b"", 0, response.text)
+            
+            buf = getattr(self._local, "recv_buf", None)
+            if buf is None:
+                buf = self._local.recv_buf = bytearray(RECV_BUFFER_SIZE)
+            pos = 0
+            chunk_count = 0
+            ttfb_ms = None
+            error = None
+            finished = False
+            for lines in self._iter_line_batches(response):
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - start) * 1000
+                for line in lines:
+                    if not line:
+                        continue
+                    if line == b"END_FLAG":
+                        finished = True
+                        break
+                    if line.startswith(b"ERROR:"):
+                        error = line.decode("utf-8", errors="replace")
+                        finished = True
+                        break
+                    # 原地寫入；超出目前大小時 bytearray 自動擴充，並保留給下一次呼叫
+                    buf[pos:pos + len(line)] = line
+                    pos += len(line)
+                    chunk_count += 1
+                if finished:
+                    break
+            
+            return StreamResult(200, ttfb_ms, (time.perf_counter() - start) * 1000,
+                                bytes(memoryview(buf)[:pos]), chunk_count, error)
+    
     def get_session_history(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         取得會話歷史
@@ -161,9 +360,9 @@ class RAGLLMAPIClient:
         """
         try:
             url = f"{self.base_url}/api/rag-llm/sessions/{session_id}/history"
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"❌ 取得會話歷史失敗: {e}")
             return None
@@ -180,9 +379,9 @@ class RAGLLMAPIClient:
         """
         try:
             url = f"{self.base_url}/api/rag-llm/sessions/{session_id}/history"
-            response = requests.delete(url, timeout=5)
+            response = self.session.delete(url, timeout=5)
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
             print(f"✅ {result.get('message', 'History cleared')}")
             return True
         except requests.exceptions.RequestException as e:
@@ -202,14 +401,13 @@ class RAGLLMAPIClient:
         try:
             url = f"{self.base_url}/api/rag-llm/close"
             payload = {"session_id": session_id}
-            response = requests.post(
+            response = self.session.post(
                 url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
+                data=orjson.dumps(payload),
                 timeout=5
             )
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
             print(f"✅ {result.get('message', 'Connection closed')}")
             if 'messages_cleared' in result:
                 print(f"   已清除 {result['messages_cleared']} 則訊息")
@@ -227,9 +425,9 @@ class RAGLLMAPIClient:
         """
         try:
             url = f"{self.base_url}/api/rag-llm/init"
-            response = requests.post(url, timeout=60)
+            response = self.session.post(url, timeout=60)
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
             if result.get('success'):
                 print("✅ RAG 系統初始化成功")
                 return True
@@ -249,9 +447,9 @@ class RAGLLMAPIClient:
         """
         try:
             url = f"{self.base_url}/api/rag-llm/warmup"
-            response = requests.post(url, timeout=120)
+            response = self.session.post(url, timeout=120)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.RequestException as e:
             print(f"❌ 模型預熱失敗: {e}")
             return None
@@ -259,6 +457,8 @@ class RAGLLMAPIClient:
 
 def main():
     """主函數：示範如何使用 API 客戶端"""
+    # 只有命令列執行才需要 argparse；作為函式庫匯入 RAGLLMAPIClient 時不載入
+    import argparse
     
     # 解析命令行參數
     parser = argparse.ArgumentParser(
@@ -311,7 +511,12 @@ def main():
     args = parser.parse_args()
     
     # 建立 API 客戶端
-    client = RAGLLMAPIClient(base_url=args.base_url)
+    with closing(RAGLLMAPIClient(base_url=args.base_url)) as client:
+        run_client(client, args)
+
+
+def run_client(client: RAGLLMAPIClient, args: "argparse.Namespace"):
+    """執行健康檢查、查詢與會話歷史顯示"""
     
     # 檢查伺服器狀態
     print("🔍 檢查伺服器狀態...")
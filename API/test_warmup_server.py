@@ -8,13 +8,14 @@ This script tests the warmup server functionality without running the full servi
 import time
 import sys
 import os
+import socket
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 
 # Add current directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from client_utils import check_service_health, warmup_models
-
 # Colors
 GREEN = "\033[92m"
 RED = "\033[91m"
@@ -22,18 +23,58 @@ BLUE = "\033[94m"
 YELLOW = "\033[93m"
 RESET = "\033[0m"
 
+# Pre-built output strings reused across the summary and section headers
+PASS = "✅ PASS"
+FAIL = "❌ FAIL"
+SEP = "=" * 50
+SEP_WIDE = "=" * 70
+
+def _port_open(host: str, port: int, timeout: float = 0.2) -> bool:
+    """Cheap TCP probe so a stopped service is detected without going through the HTTP stack"""
+    try:
+        socket.create_connection((host, port), timeout).close()
+        return True
+    except OSError:
+        return False
+
+def _import_warmup_server():
+    """Import ModelWarmupServer; returns the error (or None) instead of printing so it can run off-thread"""
+    try:
+        from model_warmup_server import ModelWarmupServer
+        return None
+    except Exception as e:
+        return e
+
 def test_warmup_server():
     """Test the warmup server components"""
     
+    # Imported here rather than at module load: client_utils pulls in requests and the project config
+    import requests
+    from requests.adapters import HTTPAdapter
+    from client_utils import check_service_health, warmup_models
+    
     API_URL = "http://localhost:5002"
     
+    # One keep-alive session for every call so the warmup reuses the health-check connection
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+    
     print(f"{BLUE}🧪 Testing Model Warmup Server Components{RESET}")
-    print("=" * 50)
+    print(SEP)
+    
+    # Test 3 does not depend on the service, so import in the background while Tests 1-2 wait on the network
+    import_executor = ThreadPoolExecutor(max_workers=1)
+    import_future = import_executor.submit(_import_warmup_server)
     
     # Test 1: Service Health Check
     print(f"\n{BLUE}Test 1: API Service Health Check{RESET}")
     try:
-        if check_service_health(API_URL):
+        api_addr = urlsplit(API_URL)
+        api_host, api_port = api_addr.hostname, api_addr.port or 80
+        if not _port_open(api_host, api_port):
+            print(f"{RED}❌ Nothing is listening on {api_host}:{api_port}{RESET}")
+            health_ok = False
+        elif check_service_health(API_URL, session=session):
             print(f"{GREEN}✅ API service is healthy{RESET}")
             health_ok = True
         else:
@@ -48,7 +89,7 @@ def test_warmup_server():
         print(f"\n{BLUE}Test 2: Model Warmup{RESET}")
         try:
             print(f"{YELLOW}🔥 Running warmup...{RESET}")
-            result = warmup_models(API_URL)
+            result = warmup_models(API_URL, session=session)
             
             if result and result.get('overall_success'):
                 print(f"{GREEN}✅ Model warmup completed successfully{RESET}")
@@ -77,34 +118,42 @@ def test_warmup_server():
         print(f"\n{YELLOW}⏭️ Skipping warmup test (service not healthy){RESET}")
         warmup_ok = False
     
+    session.close()
+    
     # Test 3: Import Test
     print(f"\n{BLUE}Test 3: Module Import Test{RESET}")
-    try:
-        from model_warmup_server import ModelWarmupServer
+    import_error = import_future.result()
+    import_executor.shutdown()
+    if import_error is None:
         print(f"{GREEN}✅ ModelWarmupServer imported successfully{RESET}")
         import_ok = True
-    except Exception as e:
-        print(f"{RED}❌ Import error: {e}{RESET}")
+    else:
+        print(f"{RED}❌ Import error: {import_error}{RESET}")
         import_ok = False
     
-    # Summary
-    print(f"\n{BLUE}📋 Test Summary{RESET}")
-    print("=" * 50)
-    print(f"Health Check: {'✅ PASS' if health_ok else '❌ FAIL'}")
-    print(f"Model Warmup: {'✅ PASS' if warmup_ok else '❌ FAIL'}")
-    print(f"Module Import: {'✅ PASS' if import_ok else '❌ FAIL'}")
-    
+    # Summary (collected and written in one go; everything above streams live)
     all_tests_passed = health_ok and warmup_ok and import_ok
-    print(f"\nOverall: {'✅ ALL TESTS PASSED' if all_tests_passed else '❌ SOME TESTS FAILED'}")
+    lines = [
+        f"\n{BLUE}📋 Test Summary{RESET}",
+        SEP,
+        f"Health Check: {PASS if health_ok else FAIL}",
+        f"Model Warmup: {PASS if warmup_ok else FAIL}",
+        f"Module Import: {PASS if import_ok else FAIL}",
+        f"\nOverall: {'✅ ALL TESTS PASSED' if all_tests_passed else '❌ SOME TESTS FAILED'}",
+    ]
     
     if not all_tests_passed:
-        print(f"\n{YELLOW}💡 Troubleshooting Tips:{RESET}")
+        lines.append(f"\n{YELLOW}💡 Troubleshooting Tips:{RESET}")
         if not health_ok:
-            print("  - Make sure RAG + LLM API service is running on http://localhost:5002")
-            print("  - Check if the service is accessible: curl http://localhost:5002/health")
+            lines.append("  - Make sure RAG + LLM API service is running on http://localhost:5002")
+            lines.append("  - Check if the service is accessible: curl http://localhost:5002/health")
         if not import_ok:
-            print("  - Ensure all required Python modules are installed")
-            print("  - Check if client_utils.py is in the same directory")
+            lines.append("  - Ensure all required Python modules are installed")
+            lines.append("  - Check if client_utils.py is in the same directory")
+    
+    lines.append("")
+    sys.stdout.write("\n".join(lines))
+    sys.stdout.flush()
     
     return all_tests_passed
 
@@ -112,7 +161,7 @@ def demo_warmup_server():
     """Demonstrate warmup server usage"""
     
     print(f"\n{BLUE}🎯 Warmup Server Usage Demo{RESET}")
-    print("=" * 50)
+    print(SEP)
     
     try:
         from model_warmup_server import ModelWarmupServer
@@ -144,7 +193,7 @@ def main():
     """Main test function"""
     
     print(f"{GREEN}🔥 Model Warmup Server Test Suite{RESET}")
-    print("=" * 70)
+    print(SEP_WIDE)
     
     # Run component tests
     test_success = test_warmup_server()
@@ -153,7 +202,7 @@ def main():
     demo_success = demo_warmup_server()
     
     # Overall result
-    print(f"\n{'='*70}")
+    print("\n" + SEP_WIDE)
     if test_success and demo_success:
         print(f"{GREEN}🎉 All tests completed successfully!{RESET}")
         print(f"{BLUE}💡 You can now run the warmup server with confidence.{RESET}")
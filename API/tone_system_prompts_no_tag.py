@@ -6,9 +6,12 @@ This module contains system prompts for different tone conversions without expre
 Each tone has its own specialized system prompt with appropriate examples and guidelines.
 """
 
+import functools
+
 PERCENTAGE = "20"
 
 
+@functools.lru_cache(maxsize=64)
 def build_query_rewriter_prompt(target_lang: str) -> str:
     """
     Build system prompt for query rewriter agent.
@@ -78,6 +81,7 @@ Now, rewrite the latest user question based on the provided history:
 """
 
 
+@functools.lru_cache(maxsize=64)
 def build_fixed_system_prompt(response_restriction: str) -> str:
     """
     Build a fixed system prompt that instructs the assistant to consume a JSON user message.
@@ -314,6 +318,7 @@ def build_fixed_system_prompt(response_restriction: str) -> str:
     - END IMMEDIATELY after the converted content - NO trailing notes, explanations, or comments whatsoever"""
 '''
 
+@functools.lru_cache(maxsize=64)
 def build_child_friendly_system_prompt(target_lang: str) -> str:
     """
     Build system prompt for a Cultural Agent that converts factual RAG output 
@@ -384,6 +389,7 @@ def build_child_friendly_system_prompt(target_lang: str) -> str:
 請接收 Part 1 的事實資料，並根據以上「科學探險隊隊長」的語氣規範進行轉換：
 """
 
+@functools.lru_cache(maxsize=64)
 def build_professional_friendly_system_prompt(target_lang: str) -> str:
     """
     Build system prompt for a Cultural Agent that converts factual RAG output 
@@ -468,6 +474,7 @@ def build_professional_friendly_system_prompt(target_lang: str) -> str:
 """
 
 
+@functools.lru_cache(maxsize=64)
 def build_casual_friendly_system_prompt(target_lang: str) -> str:
     """
     Build system prompt for a Cultural Agent that converts factual RAG output 
@@ -538,6 +545,7 @@ def build_casual_friendly_system_prompt(target_lang: str) -> str:
 請接收 Part 1 的事實資料，並根據以上「科技嚮導」的隨性語氣規範進行轉換：
 """
 
+@functools.lru_cache(maxsize=64)
 def build_elder_friendly_system_prompt(target_lang: str) -> str:
     """
     Build system prompt for a Cultural Agent that converts factual RAG output 
@@ -761,6 +769,7 @@ def is_tone_supported(tone: str) -> bool:
     """
     return tone.lower().strip() in get_supported_tones()
 
+@functools.lru_cache(maxsize=64)
 def build_tone_selector_system_prompt(target_lang: str):
     sys_prompt = f"""You are a visual tone analysis agent. Your job is to analyze visual descriptions from a Vision Language Model (VLM) and determine the most appropriate communication tone based on the person's appearance.
 
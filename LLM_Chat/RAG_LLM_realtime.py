@@ -2,6 +2,7 @@ import os
 import shutil
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 import chromadb
 import json
 import re
@@ -9,6 +10,7 @@ import argparse
 import time
 import queue
 import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 import numpy as np
@@ -41,6 +43,15 @@ RED = "\033[91m"
 BLUE = "\033[94m"
 RESET = "\033[0m"
 
+# Embedding requests: keep bge-m3 resident between queries (RAM for no cold reload) and let it
+# use every core for the CPU side of the forward pass
+EMBEDDING_KEEP_ALIVE = "30m"
+EMBEDDING_OPTIONS = {"num_thread": os.cpu_count() or 1}
+# Recent query embeddings kept in memory so a repeated query text skips the bge-m3 round trip
+EMBEDDING_CACHE_SIZE = 256
+# (connect, read) timeout for query embeddings, so a hung Ollama cannot block retrieval forever
+EMBEDDING_TIMEOUT = (3.05, 30)
+
 @dataclass
 class DocumentChunk:
     """Represents a document chunk with metadata"""
@@ -62,6 +73,15 @@ class ImprovedRAGPipeline:
         self.chunk_counter = 0  # Add counter for unique IDs
         self.cached_system_prompt: Optional[str] = None
         
+        # Keep-alive connection pool for Ollama (embeddings + chat); callers may swap in a shared session
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+        self.http.headers["Connection"] = "keep-alive"
+        
+        # query text -> embedding (LRU, shared by retrieval, caches and prefetch)
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedding_lock = threading.Lock()
+        
         # Preload jieba once at startup to avoid first-call latency
         self._initialize_jieba()
     
@@ -559,9 +579,11 @@ class ImprovedRAGPipeline:
                 if "nomic" in embedding_model:
                     prompt_text = f"search_document: {chunk.content}"
 
-                response = requests.post("http://localhost:11435/api/embeddings", json={
+                response = self.http.post("http://localhost:11435/api/embeddings", json={
                     "model": embedding_model,
-                    "prompt": prompt_text
+                    "prompt": prompt_text,
+                    "keep_alive": EMBEDDING_KEEP_ALIVE,
+                    "options": EMBEDDING_OPTIONS
                 })
                 response.raise_for_status()
                 embedding = response.json()['embedding']
@@ -626,20 +648,46 @@ class ImprovedRAGPipeline:
         self.chunks = chunks
         print(f"Built TF-IDF index with {self.tfidf_matrix.shape[1]} features")
 
-    def hybrid_search(self, query: str, chroma_collection, top_k: int = 10) -> List[Dict[str, Any]]:
-        """Hybrid search combining dense and sparse retrieval"""
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query exactly the way hybrid_search does for dense retrieval"""
+        with self._embedding_lock:
+            cached = self._embedding_cache.get(query)
+            if cached is not None:
+                self._embedding_cache.move_to_end(query)
+                return cached
+
+        # [FIX] Add 'search_query:' prefix for Nomic embedding model
+        prompt_text = f"search_query: {query}"
+        
+        q_response = self.http.post("http://localhost:11435/api/embeddings", json={
+            "model": "bge-m3:latest",
+            "prompt": prompt_text,
+            "keep_alive": EMBEDDING_KEEP_ALIVE,
+            "options": EMBEDDING_OPTIONS
+        }, timeout=EMBEDDING_TIMEOUT)
+        q_response.raise_for_status()
+        embedding = q_response.json()['embedding']
+
+        with self._embedding_lock:
+            self._embedding_cache[query] = embedding
+            while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        return embedding
+
+    def hybrid_search(self, query: str, chroma_collection, top_k: int = 10,
+                      query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Hybrid search combining dense and sparse retrieval.
+
+        Pass `query_embedding` (from embed_query) when the caller already has it,
+        so the query is not embedded twice.
+        """
         
         # Dense search (ChromaDB)
         try:
-            # [FIX] Add 'search_query:' prefix for Nomic embedding model
-            prompt_text = f"search_query: {query}"
-            
-            q_response = requests.post("http://localhost:11435/api/embeddings", json={
-                "model": "bge-m3:latest",
-                "prompt": prompt_text
-            })
-            q_response.raise_for_status()
-            q_emb = [q_response.json()['embedding']]
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            q_emb = [query_embedding]
             
             dense_results = chroma_collection.query(
                 query_embeddings=q_emb, 
@@ -867,7 +915,7 @@ def main():
             "stream": True,
             "options": {"temperature": 0}
         }
-        _resp = requests.post("http://localhost:11435/api/chat", json=warmup_payload, stream=False)
+        _resp = rag_pipeline.http.post("http://localhost:11435/api/chat", json=warmup_payload, stream=False)
         if _resp.ok:
             for _line in _resp.iter_lines():
                 if not _line:
@@ -1083,7 +1131,7 @@ def main():
             start_ts = time.time()
             first_llm_token_logged = False
             first_tts_logged = False
-            response = requests.post("http://localhost:11435/api/chat", json=request_payload, stream=True)
+            response = rag_pipeline.http.post("http://localhost:11435/api/chat", json=request_payload, stream=True)
             
             response.raise_for_status()
             
@@ -1,3 +1,43 @@
 LLM_MODEL_NAME = "linly-llama3.1:70b-instruct-q4_0"
 # CHROMA_DB_PATH = "/mnt/HDD4/thanglq/he110/Demo_GitSpace/chroma_db"
-CHROMA_DB_PATH = "/mnt/HDD4/thanglq/he110/Demo_GitSpace/chroma_db_golden"
\ No newline at end of file
+CHROMA_DB_PATH = "/mnt/HDD4/thanglq/he110/Demo_GitSpace/chroma_db_golden"
+
+# Max chat history messages kept per session (user + assistant messages, 32 = 16 turns)
+CHAT_HISTORY_MAXLEN = 32
+# ...and at most this many characters in total (oldest messages are dropped first)
+CHAT_HISTORY_MAX_CHARS = 16000
+
+# Ollama runtime options sent with every chat request. Keep them identical across calls:
+# a different num_ctx makes Ollama reload the model. The fixed system prompt + RAG context
+# + chat history can exceed 4k tokens, so 8k leaves headroom.
+LLM_NUM_CTX = 8192
+LLM_NUM_BATCH = 512
+# Upper bound on generated tokens per call, so a runaway generation can't hold a worker
+LLM_NUM_PREDICT = 512
+
+# Number of chunks retrieved per query (smaller = faster retrieval and shorter prefill)
+RAG_TOP_K = 3
+
+# Frequent visitor questions used to warm the retriever (embedder, HNSW pages, TF-IDF) after init
+WARMUP_QUERIES = [
+    "What is ITRI?",
+    "When was ITRI founded?",
+    "What research areas does ITRI focus on?",
+    "What are ITRI's most important technologies?",
+    "How has ITRI contributed to Taiwan's semiconductor industry?",
+    "What is on display in this exhibition?",
+    "Can you introduce this exhibit?",
+    "What awards has ITRI won?",
+    "How does ITRI work with industry partners?",
+    "What startups came out of ITRI?",
+    "工研院是什麼？",
+    "工研院是哪一年成立的？",
+    "工研院的研究領域有哪些？",
+    "工研院對台灣半導體產業有什麼貢獻？",
+    "這個展區在介紹什麼？",
+    "可以介紹一下這個展品嗎？",
+    "工研院有哪些重要的技術？",
+    "工研院得過哪些獎項？",
+    "工研院如何和產業合作？",
+    "工研院衍生了哪些新創公司？",
+]